@@ -0,0 +1,144 @@
+"""On-disk cache of Overpass responses used for conditional requests.
+
+Response validators (`ETag`, `Last-Modified`) are indexed in a SQLite
+database, and response bodies are stored as separate files so that they
+can be written and read as streams.
+"""
+
+import os
+import shutil
+import hashlib
+import sqlite3
+import tempfile
+
+from appdirs import user_data_dir
+
+
+def _cache_dir():
+    """Path to the cache directory."""
+    return os.path.join(user_data_dir(appname='osmxtract'), 'overpass_cache')
+
+
+def _connect():
+    """Open a connection to the cache index and create the table
+    if needed. A new connection is opened for each operation so that the
+    cache can be used from several threads.
+    """
+    cache_dir = _cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    connection = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite'))
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS validators ('
+        'key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT)'
+    )
+    return connection
+
+
+def _body_path(key):
+    """Path to the cached body of a response."""
+    return os.path.join(_cache_dir(), f'{key}.json')
+
+
+def cache_key(endpoint, query):
+    """Cache key of a query sent to a given endpoint.
+
+    Parameters
+    ----------
+    endpoint : str
+        API endpoint.
+    query : str
+        Overpass QL query.
+
+    Returns
+    -------
+    key : str
+        SHA1 hex digest of the endpoint and the query.
+    """
+    return hashlib.sha1(f'{endpoint}\0{query}'.encode('utf-8')).hexdigest()
+
+
+def get(key):
+    """Get a cached response.
+
+    Parameters
+    ----------
+    key : str
+        Cache key, as returned by `cache_key()`.
+
+    Returns
+    -------
+    entry : tuple or None
+        Cached (etag, last_modified, body_path) or `None` if missing.
+    """
+    connection = _connect()
+    try:
+        row = connection.execute(
+            'SELECT etag, last_modified FROM validators WHERE key = ?',
+            (key,)
+        ).fetchone()
+    finally:
+        connection.close()
+    body_path = _body_path(key)
+    if not row or not os.path.isfile(body_path):
+        return None
+    return row[0], row[1], body_path
+
+
+def store(key, etag, last_modified, body):
+    """Store a response in the cache.
+
+    Parameters
+    ----------
+    key : str
+        Cache key, as returned by `cache_key()`.
+    etag : str or None
+        Value of the `ETag` response header.
+    last_modified : str or None
+        Value of the `Last-Modified` response header.
+    body : bytes or file-like
+        Raw response body, or a binary file object positioned at the
+        beginning of the body. File objects are copied by chunks.
+    """
+    connection = _connect()
+    body_path = _body_path(key)
+    fd, tmp_path = tempfile.mkstemp(dir=_cache_dir(), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if isinstance(body, bytes):
+                f.write(body)
+            else:
+                shutil.copyfileobj(body, f, length=1024 ** 2)
+        os.replace(tmp_path, body_path)
+        with connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO validators VALUES (?, ?, ?)',
+                (key, etag, last_modified)
+            )
+    finally:
+        connection.close()
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+
+
+def headers(entry):
+    """Conditional request headers built from a cached entry.
+
+    Parameters
+    ----------
+    entry : tuple or None
+        Cached (etag, last_modified, body_path), as returned by `get()`.
+
+    Returns
+    -------
+    headers : dict
+        `If-None-Match` and `If-Modified-Since` headers.
+    """
+    if not entry:
+        return {}
+    etag, last_modified, _ = entry
+    conditional = {}
+    if etag:
+        conditional['If-None-Match'] = etag
+    if last_modified:
+        conditional['If-Modified-Since'] = last_modified
+    return conditional
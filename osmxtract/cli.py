@@ -1,11 +1,17 @@
 """Command-line interface."""
 
-import json
-
 import click
+import orjson
 
-from .overpass import ql_query, request, as_geojson
-from .location import geocode, from_buffer, from_file
+from .overpass import (
+    ql_query,
+    iter_elements,
+    request_many,
+    merge_responses,
+    as_geojson,
+    close_session
+)
+from .location import geocode, from_buffer, from_file, split_bounds
 
 
 @click.command()
@@ -33,10 +39,18 @@ from .location import geocode, from_buffer, from_file
 @click.option(
     '--geom', help='Output geometry type.',
     type=click.Choice(['point', 'linestring', 'polygon', 'multipolygon']))
+@click.option(
+    '--tile-size', type=click.FLOAT, default=1.0, show_default=True,
+    help='Larger extents are split into tiles of this size (in degrees) '
+         'fetched concurrently, without streaming the responses.')
 @click.argument('output', type=click.Path())
 def cli(fromfile, latlon, address, buffer, tag,
-        values, case_insensitive, geom, output):
+        values, case_insensitive, geom, tile_size, output):
     """Extract GeoJSON features from OSM with the Overpass API."""
+    if not geom:
+        raise click.BadOptionUsage(
+            'geom', 'An output geometry type must be provided.')
+
     if fromfile:
         bounds = from_file(fromfile)
     elif latlon:
@@ -45,16 +59,27 @@ def cli(fromfile, latlon, address, buffer, tag,
         lat, lon = geocode(address)
         bounds = from_buffer(lat, lon, buffer)
     else:
-        raise click.BadOptionUsage('A location must be provided.')
+        raise click.BadOptionUsage(
+            'fromfile', 'A location must be provided.')
 
     if values:
         values = values.split(',')
-    query = ql_query(bounds, tag, values, case_insensitive)
-    response = request(query)
+    tiles = split_bounds(bounds, max_size=tile_size)
+    queries = [ql_query(tile, tag, values, case_insensitive, geometry=geom)
+               for tile in tiles]
 
-    if not geom:
-        raise click.BadOptionUsage('An output geometry type must be provided.')
-    feature_collection = as_geojson(response, geom)
+    # extents larger than the tile size are split into tiles to avoid
+    # overpass timeouts, otherwise the response is parsed while being
+    # downloaded
+    try:
+        if len(queries) > 1:
+            response = merge_responses(request_many(queries))
+        else:
+            response = iter_elements(queries[0])
+        feature_collection = as_geojson(response, geom)
+    finally:
+        close_session()
 
-    with open(output, 'w') as f:
-        json.dump(feature_collection, f)
+    with open(output, 'wb') as f:
+        f.write(orjson.dumps(
+            feature_collection, option=orjson.OPT_SERIALIZE_NUMPY))
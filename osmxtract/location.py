@@ -1,12 +1,16 @@
 """Generate bounding boxes from addresses, lat/lon or input files."""
 
 import math
+from functools import lru_cache
 
 import pyproj
-import fiona
 import rasterio
+from pyogrio import read_info
+from pyogrio.errors import DataSourceError
+from rasterio.errors import RasterioIOError
+from geopy.adapters import RequestsAdapter
+from geopy.extra.rate_limiter import RateLimiter
 from geopy.geocoders import Nominatim
-from shapely.geometry import Point
 
 
 def _find_utm_crs(lat, lon):
@@ -21,16 +25,44 @@ def _find_utm_crs(lat, lon):
 
     Returns
     -------
-    crs : dict
-        Corresponding UTM CRS.
+    epsg : int
+        EPSG code of the corresponding UTM CRS.
     """
     utm_zone = (math.floor((lon + 180) // 6) % 60) + 1
     if lat >= 0:
         pole = 600
     else:
         pole = 700
-    epsg = 32000 + pole + utm_zone
-    return {'init': f'epsg:{epsg}'}
+    return 32000 + pole + utm_zone
+
+
+@lru_cache(maxsize=64)
+def _transformer(src_crs, dst_crs=4326):
+    """Get a transformer between two CRS. Transformers are cached as
+    their initialization is expensive.
+
+    Parameters
+    ----------
+    src_crs : int or pyproj.CRS
+        Source CRS or its EPSG code.
+    dst_crs : int or pyproj.CRS, optional
+        Target CRS or its EPSG code. Defaults to WGS84.
+
+    Returns
+    -------
+    transformer : pyproj.Transformer
+        Transformer using the (x, y) or (lon, lat) axis order.
+    """
+    return pyproj.Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+
+
+@lru_cache(maxsize=1)
+def _geolocator():
+    """Get the Nominatim geocoder shared by all requests, so that HTTP
+    connections are reused between calls.
+    """
+    return Nominatim(
+        user_agent='osmxtract/0.0.1', adapter_factory=RequestsAdapter)
 
 
 def geocode(address):
@@ -48,13 +80,46 @@ def geocode(address):
     lon : float
         Decimal longitude.
     """
-    geolocator = Nominatim()
-    location = geolocator.geocode(address)
+    location = _geolocator().geocode(address)
     return location.latitude, location.longitude
 
 
+def geocode_many(addresses):
+    """Retrieve lat/lon coordinates of multiple addresses with Nominatim.
+    Requests are sent sequentially with a minimum delay of one second,
+    as required by the Nominatim usage policy, and duplicate addresses
+    are only geocoded once.
+
+    Parameters
+    ----------
+    addresses : iterable of str
+        Addresses to geocode.
+
+    Returns
+    -------
+    coordinates : list of tuple
+        Decimal (lat, lon) coordinates of each address, or `None` if the
+        address could not be found.
+    """
+    rate_limited_geocode = RateLimiter(
+        _geolocator().geocode, min_delay_seconds=1, max_retries=2)
+    results = {}
+    coordinates = []
+    for address in addresses:
+        if address not in results:
+            location = rate_limited_geocode(address)
+            if location:
+                results[address] = location.latitude, location.longitude
+            else:
+                results[address] = None
+        coordinates.append(results[address])
+    return coordinates
+
+
 def _spatial_buffer(lat, lon, size, intermediate_crs):
-    """Generate a spatial buffer around a given point.
+    """Get the bounds of a spatial buffer around a given point. As the
+    buffer is a circle, its bounds are directly derived from the
+    projected coordinates of the point.
 
     Parameters
     ----------
@@ -64,17 +129,18 @@ def _spatial_buffer(lat, lon, size, intermediate_crs):
         Decimal longitude.
     size : int
         Buffer size in meters.
-    intermediate_crs : dict
-        Intermediate CRS to calculate spatial buffer in meters.
+    intermediate_crs : int
+        EPSG code of the intermediate CRS to calculate spatial buffer
+        in meters.
 
     Returns
     -------
-    buffer : shapely polygon
-        Output buffer geometry.
+    bounds : tuple
+        Bounds of the buffer in the intermediate CRS
+        (x_min, y_min, x_max, y_max).
     """
-    proj = pyproj.Proj(**intermediate_crs)
-    x, y = proj(lon, lat)
-    return Point(x, y).buffer(size)
+    x, y = _transformer(4326, intermediate_crs).transform(lon, lat)
+    return x - size, y - size, x + size, y + size
 
 
 def _reproject_bounds(bounds, src_crs):
@@ -84,23 +150,25 @@ def _reproject_bounds(bounds, src_crs):
     ----------
     bounds : tuple
         Input bounds coordinates (lat_min, lon_min, lat_max, lon_max).
-    src_crs : dict
-        CRS of the input bounds coordinates.
+    src_crs : int or pyproj.CRS
+        CRS of the input bounds coordinates or its EPSG code.
 
     Returns
     -------
     bounds : tuple
         Reprojected bounds coordinates (lat_min, lon_min, lat_max, lon_max).
     """
-    proj = pyproj.Proj(**src_crs)
+    transformer = _transformer(src_crs, 4326)
     lat_min, lon_min, lat_max, lon_max = bounds
-    lon_min, lat_max = proj(lon_min, lat_max, inverse=True)
-    lon_max, lat_min = proj(lon_max, lat_min, inverse=True)
+    # edges are densified before reprojection as they can be curved
+    # in the target CRS
+    lon_min, lat_min, lon_max, lat_max = transformer.transform_bounds(
+        lon_min, lat_min, lon_max, lat_max, densify_pts=21)
     return lat_min, lon_min, lat_max, lon_max
 
 
 def _reorder_bounds(bounds):
-    """Reorder bounds from shapely/fiona/rasterio order to the one
+    """Reorder bounds from pyogrio/rasterio order to the one
     expected by Overpass, e.g: `(x_min, y_min, x_max, y_max)` to
     `(lat_min, lon_min, lat_max, lon_max)`.
     """
@@ -108,6 +176,40 @@ def _reorder_bounds(bounds):
     return lat_min, lon_min, lat_max, lon_max
 
 
+def split_bounds(bounds, max_size=1.0):
+    """Split a bounding box into a grid of smaller tiles.
+
+    Parameters
+    ----------
+    bounds : tuple
+        Input bounding box (lat_min, lon_min, lat_max, lon_max).
+    max_size : float, optional
+        Maximum size of a tile along both axes, in decimal degrees.
+        Defaults to 1, i.e. extents larger than a metropolitan area,
+        which are likely to exceed the Overpass timeout.
+
+    Returns
+    -------
+    tiles : list of tuple
+        Output tiles (lat_min, lon_min, lat_max, lon_max).
+    """
+    lat_min, lon_min, lat_max, lon_max = bounds
+    n_rows = max(1, math.ceil((lat_max - lat_min) / max_size))
+    n_cols = max(1, math.ceil((lon_max - lon_min) / max_size))
+    lat_step = (lat_max - lat_min) / n_rows
+    lon_step = (lon_max - lon_min) / n_cols
+    tiles = []
+    for row in range(n_rows):
+        for col in range(n_cols):
+            tiles.append((
+                lat_min + row * lat_step,
+                lon_min + col * lon_step,
+                lat_min + (row + 1) * lat_step,
+                lon_min + (col + 1) * lon_step
+            ))
+    return tiles
+
+
 def from_buffer(lat, lon, buffer_size):
     """Get bounding box from a buffer.
 
@@ -126,8 +228,8 @@ def from_buffer(lat, lon, buffer_size):
         Output bounding box (lat_min, lon_min, lat_max, lon_max).
     """
     intermediate_crs = _find_utm_crs(lat, lon)
-    buffer = _spatial_buffer(lat, lon, buffer_size, intermediate_crs)
-    bounds = _reorder_bounds(buffer.bounds)
+    bounds = _spatial_buffer(lat, lon, buffer_size, intermediate_crs)
+    bounds = _reorder_bounds(bounds)
     bounds = _reproject_bounds(bounds, intermediate_crs)
     return bounds
 
@@ -146,24 +248,28 @@ def from_file(filename):
         Output bounds (lat_min, lon_min, lat_max, lon_max).
     """
     try:
-        with fiona.open(filename) as src:
-            bounds, crs = src.bounds, src.crs
-    except:
+        info = read_info(filename, force_total_bounds=True)
+        bounds, crs = info['total_bounds'], info['crs']
+    except DataSourceError:
+        # not a vector file: try to open it as a raster, without adding
+        # the dataset to the GDAL cache as it is only opened once
         try:
-            with rasterio.open(filename) as src:
+            with rasterio.open(filename, sharing=False) as src:
                 bounds, crs = src.bounds, src.crs
-        except:
-            raise IOError('Unable to read metadata from input file.')
+        except RasterioIOError as exc:
+            raise IOError('Unable to read metadata from input file.') from exc
 
     # default CRS if not assigned
-    if not crs:
-        crs = {'init': 'epsg:4326'}
+    if crs:
+        crs = pyproj.CRS.from_user_input(crs)
+    else:
+        crs = pyproj.CRS.from_epsg(4326)
 
-    # reorder from fiona and rasterio
+    # reorder from pyogrio and rasterio
     lon_min, lat_min, lon_max, lat_max = bounds
     bounds = lat_min, lon_min, lat_max, lon_max
 
-    if crs['init'].lower() != 'epsg:4326':
+    if crs.to_epsg() != 4326:
         bounds = _reproject_bounds(bounds, crs)
 
     return bounds
@@ -2,9 +2,20 @@
 as GeoJSON.
 """
 
+import time
+import tempfile
+import threading
+from operator import itemgetter
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+import ijson
+import orjson
 import requests
-import geojson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from . import cache
 from .errors import (
     OverpassBadRequest,
     OverpassMoved,
@@ -13,6 +24,49 @@ from .errors import (
 )
 
 
+_SESSION = None
+
+# (lon, lat) coordinates of a node from its JSON representation
+_lonlat = itemgetter('lon', 'lat')
+
+
+def get_session():
+    """Get the HTTP session shared by all requests to remote services.
+
+    The session is lazily constructed on first use. It keeps connections
+    alive between requests and retries on 429 and 504 errors with an
+    exponential backoff.
+
+    Returns
+    -------
+    session : requests.Session
+        Shared HTTP session.
+    """
+    global _SESSION
+    if _SESSION is None:
+        retry = Retry(
+            total=5,
+            backoff_factor=1.0,
+            status_forcelist=(429, 504),
+            allowed_methods=['HEAD', 'GET'],
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=4, pool_maxsize=4, max_retries=retry)
+        _SESSION = requests.Session()
+        _SESSION.mount('http://', adapter)
+        _SESSION.mount('https://', adapter)
+    return _SESSION
+
+
+def close_session():
+    """Close the shared HTTP session and its pooled connections."""
+    global _SESSION
+    if _SESSION is not None:
+        _SESSION.close()
+        _SESSION = None
+
+
 def _make_case_insensitive(value):
     """Replace the first character of a string by an uppercase-lowercase
     regex.
@@ -35,7 +89,8 @@ def _bbox(lat_min, lon_min, lat_max, lon_max):
     return f'({lat_min},{lon_min},{lat_max},{lon_max})'
 
 
-def ql_query(bounds, tag, values=None, case_insensitive=False, timeout=25):
+def ql_query(bounds, tag, values=None, case_insensitive=False, timeout=25,
+             geometry=None):
     """Build an Overpass QL query.
 
     Parameters
@@ -51,13 +106,62 @@ def ql_query(bounds, tag, values=None, case_insensitive=False, timeout=25):
         Defaults to `False`.
     timeout : int, optional
         Overpass timeout. Defaults to 25.
+    geometry : str, optional
+        Output geometry type: point, linestring, polygon or multipolygon.
+        If provided, only the relevant elements are requested, and node
+        geometries are not returned for points. By default, all element
+        types are requested with their full geometry.
 
     Returns
     -------
     query : str
         Formatted Overpass QL query.
     """
-    bbox = _bbox(*bounds)
+    values = tuple(values) if values else None
+    if geometry:
+        geometry = geometry.lower()
+        if geometry not in _STATEMENTS:
+            raise ValueError('Bad geometry type.')
+    head, tail = _template(tag, values, case_insensitive, timeout, geometry)
+    return head + _bbox(*bounds) + tail
+
+
+# geometry type -> (query statement, output statement)
+_STATEMENTS = {
+    None: ('nwr', 'out geom qt;'),
+    'point': ('node', 'out qt;'),
+    'linestring': ('way', 'out geom qt;'),
+    'polygon': ('way', 'out geom qt;'),
+    'multipolygon': ('relation["type"="multipolygon"]', 'out geom qt;')
+}
+
+
+@lru_cache(maxsize=256)
+def _template(tag, values, case_insensitive, timeout, geometry=None):
+    """Build the parts of an Overpass QL query surrounding the bounding box.
+    Templates are cached as they are shared by all the queries of a tile
+    sweep.
+
+    Parameters
+    ----------
+    tag : str
+        OSM tag to query (ex: "highway").
+    values : tuple of str or None
+        Possible values for the provided OSM tag.
+    case_insensitive : bool
+        Make the first character of each value case insensitive.
+    timeout : int
+        Overpass timeout.
+    geometry : str or None, optional
+        Output geometry type. Defaults to `None` (all element types).
+
+    Returns
+    -------
+    head : str
+        Part of the query preceding the bounding box.
+    tail : str
+        Part of the query following the bounding box.
+    """
     if values:
         if case_insensitive:
             values = [_make_case_insensitive(v) for v in values]
@@ -67,10 +171,27 @@ def ql_query(bounds, tag, values=None, case_insensitive=False, timeout=25):
             query = f'["{ tag }"="{ values[0] }"]'
     else:
         query = f'["{ tag }"]'
-    return f'[out:json][timeout:{ timeout }]; nwr{ query }{ bbox }; out geom qt;'
+    statement, output = _STATEMENTS[geometry]
+    return (f'[out:json][timeout:{ timeout }]; { statement }{ query }',
+            f'; { output }')
 
 
-def request(query, endpoint='http://overpass-api.de/api/interpreter'):
+def _raise_for_status(response):
+    """Raise the corresponding exception if the Overpass API returned
+    an error status code.
+    """
+    if response.status_code == 302:
+        raise OverpassMoved
+    elif response.status_code == 400:
+        raise OverpassBadRequest
+    elif response.status_code == 429:
+        raise OverpassTooManyRequests
+    elif response.status_code == 504:
+        raise OverpassGatewayTimeout
+
+
+def request(query, endpoint='http://overpass-api.de/api/interpreter',
+            timeout=25, use_cache=True):
     """Send a request to the Overpass API.
 
     Parameters
@@ -79,22 +200,205 @@ def request(query, endpoint='http://overpass-api.de/api/interpreter'):
         Overpass QL query.
     endpoint : str, optional
         API endpoint, defaults to `http://overpass-api.de/api/interpreter`.
+    timeout : int, optional
+        Overpass timeout of the query, in seconds. Used to derive the
+        client-side read timeout. Defaults to 25.
+    use_cache : bool, optional
+        Store responses on disk and send conditional requests
+        (`If-None-Match`, `If-Modified-Since`) for queries that have
+        already been sent to the same endpoint. The cached response is
+        returned if the server answers with 304 Not Modified.
+        Defaults to `True`.
 
     Returns
     -------
     response : dict
         JSON response as a dictionnary.
     """
-    response = requests.get(endpoint, params={'data': query})
-    if response.status_code == 302:
-        raise OverpassMoved
-    elif response.status_code == 400:
-        raise OverpassBadRequest
-    elif response.status_code == 429:
-        raise OverpassTooManyRequests
-    elif response.status_code == 504:
-        raise OverpassGatewayTimeout
-    return response.json()
+    key, entry = None, None
+    if use_cache:
+        key = cache.cache_key(endpoint, query)
+        entry = cache.get(key)
+    session = get_session()
+    response = session.get(
+        endpoint, params={'data': query}, headers=cache.headers(entry),
+        timeout=(5, timeout + 5))
+    if response.status_code == 304 and entry:
+        with open(entry[2], 'rb') as f:
+            return orjson.loads(f.read())
+    _raise_for_status(response)
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if use_cache and (etag or last_modified):
+        cache.store(key, etag, last_modified, response.content)
+    return orjson.loads(response.content)
+
+
+class _TeeReader:
+    """File-like wrapper writing a copy of the bytes read from a stream
+    to another file, so that a streamed response body can be cached
+    once fully parsed.
+
+    Parameters
+    ----------
+    raw : file-like
+        Input stream.
+    copy : file-like
+        Binary file receiving the copy.
+    """
+
+    def __init__(self, raw, copy):
+        self.raw = raw
+        self.copy = copy
+
+    def read(self, size=-1):
+        """Read bytes from the stream and write a copy."""
+        chunk = self.raw.read(size)
+        self.copy.write(chunk)
+        return chunk
+
+
+def iter_elements(query, endpoint='http://overpass-api.de/api/interpreter',
+                  timeout=25, use_cache=True):
+    """Send a request to the Overpass API and stream the elements of the
+    response as they are parsed, without loading the whole JSON document
+    in memory.
+
+    Parameters
+    ----------
+    query : str
+        Overpass QL query.
+    endpoint : str, optional
+        API endpoint, defaults to `http://overpass-api.de/api/interpreter`.
+    timeout : int, optional
+        Overpass timeout of the query, in seconds. Defaults to 25.
+    use_cache : bool, optional
+        Use the same on-disk cache and conditional requests as `request()`.
+        The cached body is streamed from disk if the server answers with
+        304 Not Modified. Otherwise, if the response can be revalidated,
+        the raw body is spooled to a temporary file while it is parsed and
+        stored once all the elements have been read. Defaults to `True`.
+
+    Returns
+    -------
+    elements : iterator of dict
+        JSON response elements.
+    """
+    key, entry = None, None
+    if use_cache:
+        key = cache.cache_key(endpoint, query)
+        entry = cache.get(key)
+    session = get_session()
+    with session.get(endpoint, params={'data': query},
+                     headers=cache.headers(entry), stream=True,
+                     timeout=(5, timeout + 5)) as response:
+        if response.status_code == 304 and entry:
+            with open(entry[2], 'rb') as f:
+                yield from ijson.items(f, 'elements.item', use_float=True)
+            return
+        _raise_for_status(response)
+        response.raw.decode_content = True
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not use_cache or not (etag or last_modified):
+            yield from ijson.items(
+                response.raw, 'elements.item', use_float=True)
+            return
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 ** 2) as copy:
+            body = _TeeReader(response.raw, copy)
+            yield from ijson.items(body, 'elements.item', use_float=True)
+            # consume the end of the document before caching it
+            while body.read(1024 ** 2):
+                pass
+            copy.seek(0)
+            cache.store(key, etag, last_modified, copy)
+
+
+class _RateLimiter:
+    """Thread-safe limiter ensuring a minimum delay between two calls.
+
+    Parameters
+    ----------
+    min_delay : float
+        Minimum delay between two calls, in seconds.
+    """
+
+    def __init__(self, min_delay):
+        self.min_delay = min_delay
+        self._lock = threading.Lock()
+        self._last_call = None
+
+    def wait(self):
+        """Block until the next call is allowed."""
+        with self._lock:
+            now = time.monotonic()
+            if self._last_call is not None:
+                delay = self._last_call + self.min_delay - now
+                if delay > 0:
+                    time.sleep(delay)
+                    now = time.monotonic()
+            self._last_call = now
+
+
+def request_many(queries, endpoint='http://overpass-api.de/api/interpreter',
+                 timeout=25, max_workers=2, min_delay=1.0):
+    """Send multiple requests to the Overpass API concurrently.
+
+    Requests are sent from a bounded pool of threads sharing the same
+    HTTP session, and are rate limited to comply with the Overpass usage
+    policy.
+
+    Parameters
+    ----------
+    queries : iterable of str
+        Overpass QL queries.
+    endpoint : str, optional
+        API endpoint, defaults to `http://overpass-api.de/api/interpreter`.
+    timeout : int, optional
+        Overpass timeout of the queries, in seconds. Defaults to 25.
+    max_workers : int, optional
+        Maximum number of concurrent requests. Defaults to 2.
+    min_delay : float, optional
+        Minimum delay between two requests, in seconds. Defaults to 1.
+
+    Returns
+    -------
+    responses : list of dict
+        JSON responses, in the same order as the queries.
+    """
+    limiter = _RateLimiter(min_delay)
+
+    def _request(query):
+        limiter.wait()
+        return request(query, endpoint=endpoint, timeout=timeout)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_request, queries))
+
+
+def merge_responses(responses):
+    """Merge multiple Overpass JSON responses into a single one.
+    Elements returned by more than one response, e.g. ways crossing
+    the boundary between two tiles, are only kept once.
+
+    Parameters
+    ----------
+    responses : iterable of dict
+        Overpass JSON responses.
+
+    Returns
+    -------
+    response : dict
+        Merged JSON response.
+    """
+    elements, seen = [], set()
+    for response in responses:
+        for elem in response['elements']:
+            key = (elem.get('type'), elem.get('id'))
+            if key not in seen:
+                seen.add(key)
+                elements.append(elem)
+    return {'elements': elements}
 
 
 def _as_points(elements):
@@ -102,8 +406,8 @@ def _as_points(elements):
 
     Parameters
     ----------
-    elements : list of dict
-        JSON response elements.
+    elements : iterable of dict
+        JSON response elements of type `node`.
 
     Returns
     -------
@@ -111,12 +415,15 @@ def _as_points(elements):
         Output GeoJSON FeatureCollection.
     """
     features = []
-    elements = [e for e in elements if e.get('type') == 'node']
     for elem in elements:
         coords = [elem['lon'], elem['lat']]
-        geom = geojson.Point(coordinates=coords)
-        features.append(geojson.Feature(elem['id'], geom, elem['tags']))
-    return geojson.FeatureCollection(features)
+        features.append({
+            'type': 'Feature',
+            'id': elem['id'],
+            'geometry': {'type': 'Point', 'coordinates': coords},
+            'properties': elem['tags']
+        })
+    return {'type': 'FeatureCollection', 'features': features}
 
 
 def _as_linestrings(elements):
@@ -124,8 +431,8 @@ def _as_linestrings(elements):
 
     Parameters
     ----------
-    elements : list of dict
-        JSON response elements.
+    elements : iterable of dict
+        JSON response elements of type `way`.
 
     Returns
     -------
@@ -133,12 +440,15 @@ def _as_linestrings(elements):
         Output GeoJSON FeatureCollection.
     """
     features = []
-    elements = [e for e in elements if e.get('type') == 'way']
     for elem in elements:
-        coords = [[node['lon'], node['lat']] for node in elem['geometry']]
-        geom = geojson.LineString(coordinates=coords)
-        features.append(geojson.Feature(elem['id'], geom, elem['tags']))
-    return geojson.FeatureCollection(features)
+        coords = list(map(_lonlat, elem['geometry']))
+        features.append({
+            'type': 'Feature',
+            'id': elem['id'],
+            'geometry': {'type': 'LineString', 'coordinates': coords},
+            'properties': elem['tags']
+        })
+    return {'type': 'FeatureCollection', 'features': features}
 
 
 def _as_polygons(elements):
@@ -146,8 +456,8 @@ def _as_polygons(elements):
 
     Parameters
     ----------
-    elements : list of dict
-        JSON response elements.
+    elements : iterable of dict
+        JSON response elements of type `way`.
 
     Returns
     -------
@@ -155,12 +465,15 @@ def _as_polygons(elements):
         Output GeoJSON FeatureCollection.    
     """
     features = []
-    elements = [e for e in elements if e.get('type') == 'way']
     for elem in elements:
-        coords = [[node['lon'], node['lat']] for node in elem['geometry']]
-        geom = geojson.Polygon(coordinates=[coords])
-        features.append(geojson.Feature(elem['id'], geom, elem['tags']))
-    return geojson.FeatureCollection(features)
+        coords = list(map(_lonlat, elem['geometry']))
+        features.append({
+            'type': 'Feature',
+            'id': elem['id'],
+            'geometry': {'type': 'Polygon', 'coordinates': [coords]},
+            'properties': elem['tags']
+        })
+    return {'type': 'FeatureCollection', 'features': features}
 
 
 def _as_multipolygons(elements):
@@ -168,8 +481,8 @@ def _as_multipolygons(elements):
 
     Parameters
     ----------
-    elements : list of dict
-        JSON response elements.
+    elements : iterable of dict
+        JSON response elements of type `relation`.
 
     Returns
     -------
@@ -177,19 +490,29 @@ def _as_multipolygons(elements):
         Output GeoJSON FeatureCollection.
     """
     features = []
-    elements = [e for e in elements if
-                e.get('type') == 'relation' and
-                e['tags']['type'] == 'multipolygon']
     for elem in elements:
-        coords = []
-        for member in elem['members']:
-            member_coords = []
-            for node in member['geometry']:
-                member_coords.append([node['lon'], node['lat']])
-            coords.append(member_coords)
-        geom = geojson.MultiPolygon(coordinates=[coords])
-        features.append(geojson.Feature(elem['id'], geom, elem['tags']))
-    return geojson.FeatureCollection(features)
+        tags = elem.get('tags', {})
+        if tags.get('type') != 'multipolygon':
+            continue
+        # members without geometry (ex: label nodes) are not rings
+        coords = [list(map(_lonlat, member['geometry']))
+                  for member in elem['members'] if 'geometry' in member]
+        features.append({
+            'type': 'Feature',
+            'id': elem['id'],
+            'geometry': {'type': 'MultiPolygon', 'coordinates': [coords]},
+            'properties': tags
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+# geometry type -> (overpass element type, parser)
+_PARSERS = {
+    'point': ('node', _as_points),
+    'linestring': ('way', _as_linestrings),
+    'polygon': ('way', _as_polygons),
+    'multipolygon': ('relation', _as_multipolygons)
+}
 
 
 def as_geojson(response, geometry):
@@ -198,24 +521,43 @@ def as_geojson(response, geometry):
 
     Parameters
     ----------
-    response : json dict
-        Overpass JSON response.
-    geometry : str
+    response : json dict or iterable of dict
+        Overpass JSON response, or an iterable of its elements as
+        returned by `iter_elements()`.
+    geometry : str or list of str
         GeoJSON geometry type: point, linestring, polygon or multipolygon.
-    
+        If a list is provided, one FeatureCollection per geometry type is
+        returned. Elements are read only once in both cases.
+
     Returns
     -------
     feature_collection : dict
-        GeoJSON FeatureCollection.
-    """
-    geometry = geometry.lower()
-    if geometry == 'point':
-        return _as_points(response['elements'])
-    elif geometry == 'linestring':
-        return _as_linestrings(response['elements'])
-    elif geometry == 'polygon':
-        return _as_polygons(response['elements'])
-    elif geometry == 'multipolygons':
-        return _as_multipolygons(response['elements'])
+        GeoJSON FeatureCollection, or a dict of FeatureCollections indexed
+        by geometry type if a list of geometry types is provided.
+    """
+    if isinstance(geometry, str):
+        geometries = [geometry.lower()]
     else:
+        geometries = [geom.lower() for geom in geometry]
+    if any(geom not in _PARSERS for geom in geometries):
         raise ValueError('Bad geometry type.')
+
+    if isinstance(response, dict):
+        elements = response['elements']
+    else:
+        elements = response
+
+    # sort elements by type in a single pass
+    buckets = {_PARSERS[geom][0]: [] for geom in geometries}
+    for elem in elements:
+        bucket = buckets.get(elem.get('type'))
+        if bucket is not None:
+            bucket.append(elem)
+
+    collections = {}
+    for geom in geometries:
+        elem_type, parser = _PARSERS[geom]
+        collections[geom] = parser(buckets[elem_type])
+    if isinstance(geometry, str):
+        return collections[geometries[0]]
+    return collections
@@ -3,31 +3,80 @@
 import os
 import shutil
 
-import requests
 import fiona
+import shapely
+from pyogrio.raw import read
+from shapely.geometry import mapping
 from tqdm import tqdm
 from appdirs import user_data_dir
 
+from .overpass import get_session
+
 
 URL = 'http://data.openstreetmapdata.com/water-polygons-split-4326.zip'
 
 
+def _remove(*paths):
+    """Remove files if they exist."""
+    for path in paths:
+        if os.path.isfile(path):
+            os.remove(path)
+
+
 def download():
-    """Download water-polygons shapefile."""
+    """Download water-polygons shapefile. Interrupted downloads are
+    resumed from the partially downloaded file, provided that the
+    remote file did not change in the meantime."""
     dst_dir = user_data_dir(appname='osmxtract')
     os.makedirs(dst_dir, exist_ok=True)
     filename = URL.split('/')[-1]
     dst_file = os.path.join(dst_dir, filename)
-    r = requests.head(URL)
-    content_length = int(r.headers['Content-Length'])
-    progress = tqdm(total=content_length, unit='B', unit_scale=True)
-    chunk_size = 1024 ** 2
-    with requests.get(URL, stream=True) as r:
-        with open(dst_file, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=chunk_size):
-                if chunk:
-                    f.write(chunk)
-                    progress.update(chunk_size)
+    tmp_file = dst_file + '.part'
+    # ETag or Last-Modified of the remote file when download started
+    validator_file = tmp_file + '.validator'
+    # ask for the raw bytes of the file, as byte ranges and the bytes
+    # written to disk must refer to the same representation
+    resume_from, headers = 0, {'Accept-Encoding': 'identity'}
+    if os.path.isfile(tmp_file) and os.path.isfile(validator_file):
+        resume_from = os.path.getsize(tmp_file)
+        with open(validator_file) as f:
+            validator = f.read()
+        headers.update({
+            'Range': f'bytes={resume_from}-', 'If-Range': validator})
+    session = get_session()
+    # the read timeout applies between two chunks, so that a stalled
+    # connection fails and the download can be resumed
+    with session.get(URL, headers=headers, stream=True,
+                     timeout=(5, 60)) as r:
+        # requested range starts at the end of the file: already complete
+        # if the partial file has the expected size, corrupted otherwise
+        if r.status_code == 416 and resume_from:
+            total = r.headers.get('Content-Range', '').rpartition('/')[2]
+            if total.isdigit() and int(total) == resume_from:
+                os.replace(tmp_file, dst_file)
+                _remove(validator_file)
+                return
+            _remove(tmp_file, validator_file)
+            return download()
+        r.raise_for_status()
+        # remote file changed or range request ignored: restart from scratch
+        if r.status_code != 206:
+            resume_from = 0
+            _remove(validator_file)
+            validator = r.headers.get('ETag') or r.headers.get('Last-Modified')
+            if validator:
+                with open(validator_file, 'w') as f:
+                    f.write(validator)
+        content_length = int(r.headers.get('Content-Length', 0))
+        mode = 'ab' if resume_from else 'wb'
+        with open(tmp_file, mode) as f:
+            with tqdm.wrapattr(
+                    f, 'write', total=resume_from + content_length,
+                    initial=resume_from, unit='B',
+                    unit_scale=True) as f_progress:
+                shutil.copyfileobj(r.raw, f_progress, length=1024 ** 2)
+    os.replace(tmp_file, dst_file)
+    _remove(validator_file)
 
 
 def is_downloaded():
@@ -39,6 +88,36 @@ def is_downloaded():
     return os.path.isfile(expected_path)
 
 
+def convert():
+    """Convert the downloaded water-polygons shapefile to FlatGeobuf.
+    Contrary to the zipped shapefile, the FlatGeobuf file embeds a
+    spatial index so that features intersecting a bounding box can be
+    read without scanning the whole dataset.
+    """
+    data_dir = user_data_dir(appname='osmxtract')
+    zip_path = os.path.join(data_dir, 'water-polygons-split-4326.zip')
+    shp_path = 'water-polygons-split-4326/water_polygons.shp'
+    fgb_path = os.path.join(data_dir, 'water-polygons-split-4326.fgb')
+    try:
+        with fiona.open(f'zip://{zip_path}!{shp_path}') as src:
+            with fiona.open(fgb_path, 'w', driver='FlatGeobuf',
+                            schema=src.schema, crs=src.crs) as dst:
+                dst.writerecords(src)
+    except BaseException:
+        if os.path.isfile(fgb_path):
+            os.remove(fgb_path)
+        raise
+
+
+def is_converted():
+    """Check if seas shapefile is converted to FlatGeobuf."""
+    data_dir = user_data_dir(appname='osmxtract')
+    expected_path = os.path.join(
+        data_dir, 'water-polygons-split-4326.fgb'
+    )
+    return os.path.isfile(expected_path)
+
+
 def clean():
     """Clean downloaded data."""
     data_dir = user_data_dir(appname='osmxtract')
@@ -60,10 +139,21 @@ def get_water_polygons(bounds):
         Output features as an iterable of GeoJSON-like dicts.
     """
     data_dir = user_data_dir(appname='osmxtract')
-    if not is_downloaded():
-        download()
-    zip_path = os.path.join(data_dir, 'water-polygons-split-4326.zip')
-    shp_path = '/water-polygons-split-4326/water_polygons.shp'
-    with fiona.open(shp_path, vfs=f'zip://{zip_path}') as src:
-        features = [feature for _, feature in src.items(bbox=bounds)]
+    if not is_converted():
+        if not is_downloaded():
+            download()
+        convert()
+    fgb_path = os.path.join(data_dir, 'water-polygons-split-4326.fgb')
+    meta, _, geometries, field_data = read(fgb_path, bbox=bounds)
+    geometries = shapely.from_wkb(geometries)
+    fields = [values.tolist() for values in field_data]
+    features = []
+    for i, geom in enumerate(geometries):
+        features.append({
+            'type': 'Feature',
+            'geometry': mapping(geom),
+            'properties': {
+                name: values[i] for name, values in zip(meta['fields'], fields)
+            }
+        })
     return features
@@ -30,13 +30,16 @@ setup(
     packages=find_packages(exclude=['contrib', 'docs', 'tests']),
     install_requires=[
         'requests',
+        'urllib3>=1.26',
         'click',
-        'pyproj',
-        'geojson',
-        'shapely',
+        'pyproj>=3.1',
+        'ijson',
+        'orjson',
+        'shapely>=2.0',
         'fiona',
+        'pyogrio',
         'rasterio',
-        'geopy',
+        'geopy>=2.0',
         'tqdm',
         'appdirs'
     ],
@@ -0,0 +1,57 @@
+import io
+
+import pytest
+
+from osmxtract import cache, overpass, seas
+
+
+class StubResponse:
+    """Minimal stand-in for a streamed `requests.Response`."""
+
+    def __init__(self, status_code, headers=None, body=b''):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = body
+        self.raw = io.BytesIO(body)
+
+    def raise_for_status(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class StubSession:
+    """Session returning predefined responses and recording requests."""
+
+    def __init__(self, responses):
+        self.responses = [StubResponse(*r) for r in responses]
+        self.sent_headers = []
+        self.sent_kwargs = []
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        self.sent_headers.append(headers)
+        self.sent_kwargs.append(kwargs)
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def stub_session(monkeypatch, tmp_path):
+    """Factory replacing the shared HTTP session by a `StubSession`
+    built from (status_code, headers, body) tuples. Data and cache
+    files are written to a temporary directory.
+    """
+    cache_dir = str(tmp_path / 'overpass_cache')
+    monkeypatch.setattr(cache, '_cache_dir', lambda: cache_dir)
+    monkeypatch.setattr(seas, 'user_data_dir', lambda appname: str(tmp_path))
+
+    def _stub_session(responses):
+        session = StubSession(responses)
+        monkeypatch.setattr(overpass, 'get_session', lambda: session)
+        monkeypatch.setattr(seas, 'get_session', lambda: session)
+        return session
+
+    return _stub_session
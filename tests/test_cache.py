@@ -0,0 +1,38 @@
+import io
+import os
+
+from osmxtract import cache
+
+_QUERY = '[out:json][timeout:25]; nwr["highway"](44.84,3.94,44.96,4.09); out geom qt;'
+_ENDPOINT_1 = 'http://overpass-api.de/api/interpreter'
+_ENDPOINT_2 = 'https://overpass.kumi.systems/api/interpreter'
+
+
+def test_cache_key_endpoint():
+    key_1 = cache.cache_key(_ENDPOINT_1, _QUERY)
+    key_2 = cache.cache_key(_ENDPOINT_2, _QUERY)
+    assert key_1 != key_2
+
+
+def test_cache_roundtrip(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'overpass_cache')
+    monkeypatch.setattr(cache, '_cache_dir', lambda: cache_dir)
+    key = cache.cache_key(_ENDPOINT_1, _QUERY)
+    assert cache.get(key) is None
+    cache.store(key, '"abc"', None, b'{"elements": []}')
+    etag, last_modified, body_path = cache.get(key)
+    assert (etag, last_modified) == ('"abc"', None)
+    with open(body_path, 'rb') as f:
+        assert f.read() == b'{"elements": []}'
+    assert cache.headers(cache.get(key)) == {'If-None-Match': '"abc"'}
+
+
+def test_cache_store_file(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'overpass_cache')
+    monkeypatch.setattr(cache, '_cache_dir', lambda: cache_dir)
+    key = cache.cache_key(_ENDPOINT_1, _QUERY)
+    cache.store(key, None, 'Tue, 13 Oct 2026', io.BytesIO(b'{"elements": []}'))
+    with open(cache.get(key)[2], 'rb') as f:
+        assert f.read() == b'{"elements": []}'
+    # temporary files are moved or removed
+    assert sorted(os.listdir(cache_dir)) == [f'{key}.json', 'index.sqlite']
@@ -1,16 +1,23 @@
+import pytest
+
+from osmxtract import location
 from osmxtract.location import (
     _find_utm_crs,
     geocode,
+    geocode_many,
     _spatial_buffer,
     _reproject_bounds,
+    split_bounds,
+    from_buffer,
+    from_file,
 )
 
 _ADDRESS = 'Université Libre de Bruxelles'
 _LAT = 50.81
 _LON = 4.38
-_CRS = {'init': 'epsg:32631'}
+_CRS = 32631
 _UTM_BOUNDS = (587227.11, 5619604.09, 607227.11, 5639604.09)
-_WGS84_BOUNDS = (3.94, 44.84, 4.09, 44.96)
+_WGS84_BOUNDS = (3.94, 44.83, 4.09, 44.97)
 _BUFFER_SIZE = 10000
 
 
@@ -25,9 +32,37 @@ def test_geocode():
     assert (lat, lon) == (_LAT, _LON)
 
 
+class _StubLocation:
+
+    def __init__(self, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+
+
+class _StubGeolocator:
+
+    def __init__(self):
+        self.calls = []
+
+    def geocode(self, address):
+        self.calls.append(address)
+        if address == _ADDRESS:
+            return _StubLocation(_LAT, _LON)
+        return None
+
+
+def test_geocode_many(monkeypatch):
+    geolocator = _StubGeolocator()
+    monkeypatch.setattr(location, '_geolocator', lambda: geolocator)
+    addresses = [_ADDRESS, 'Nowhere', _ADDRESS]
+    coordinates = geocode_many(addresses)
+    assert coordinates == [(_LAT, _LON), None, (_LAT, _LON)]
+    assert geolocator.calls == [_ADDRESS, 'Nowhere']
+
+
 def test_bounds_from_buffer():
-    buffer = _spatial_buffer(_LAT, _LON, 10000, _CRS)
-    bounds = tuple([round(b, 2) for b in buffer.bounds])
+    bounds = _spatial_buffer(_LAT, _LON, 10000, _CRS)
+    bounds = tuple([round(b, 2) for b in bounds])
     assert bounds == _UTM_BOUNDS
 
 
@@ -35,3 +70,24 @@ def test_reproject_bounds():
     bounds = _reproject_bounds(_UTM_BOUNDS, _CRS)
     bounds = tuple([round(b, 2) for b in bounds])
     assert bounds == _WGS84_BOUNDS
+
+
+def test_split_bounds():
+    tiles = split_bounds((44.0, 4.0, 44.5, 4.2), max_size=0.25)
+    assert len(tiles) == 2
+    assert tiles[0] == (44.0, 4.0, 44.25, 4.2)
+    assert tiles[1] == (44.25, 4.0, 44.5, 4.2)
+    assert split_bounds(_WGS84_BOUNDS, max_size=1) == [_WGS84_BOUNDS]
+
+
+def test_split_bounds_city():
+    # a city-sized extent is fetched as a single tile
+    bounds = from_buffer(_LAT, _LON, 20000)
+    assert split_bounds(bounds) == [bounds]
+
+
+def test_from_file_unreadable(tmp_path):
+    filename = tmp_path / 'metadata.txt'
+    filename.write_text('not a geospatial file')
+    with pytest.raises(IOError):
+        from_file(str(filename))
@@ -1,4 +1,16 @@
-from osmxtract.overpass import ql_query
+import time
+
+from osmxtract import overpass
+from osmxtract.overpass import (
+    ql_query,
+    request,
+    iter_elements,
+    get_session,
+    close_session,
+    request_many,
+    merge_responses,
+    as_geojson,
+)
 
 
 _BOUNDS = (44.84, 3.94, 44.96, 4.09)
@@ -56,3 +68,141 @@ _EXPECTED_4 = (
 def test_ql_query_novalue():
     query = ql_query(_BOUNDS, _TAG, case_insensitive=False)
     assert query == _EXPECTED_4
+
+def test_ql_query_empty_values():
+    query = ql_query(_BOUNDS, _TAG, [], case_insensitive=False)
+    assert query == _EXPECTED_4
+
+# overpass ql queries tailored to the output geometry type
+
+_EXPECTED_5 = (
+    '[out:json][timeout:25]; '
+    'node["amenity"~"cafe|bar"](44.84,3.94,44.96,4.09); '
+    'out qt;'
+)
+
+def test_ql_query_point():
+    query = ql_query(_BOUNDS, 'amenity', ['cafe', 'bar'], geometry='point')
+    assert query == _EXPECTED_5
+
+_EXPECTED_6 = (
+    '[out:json][timeout:25]; '
+    'relation["type"="multipolygon"]["natural"="water"]'
+    '(44.84,3.94,44.96,4.09); '
+    'out geom qt;'
+)
+
+def test_ql_query_multipolygon():
+    query = ql_query(_BOUNDS, 'natural', ['water'], geometry='multipolygon')
+    assert query == _EXPECTED_6
+
+# shared http session
+
+def test_session_reuse():
+    session = get_session()
+    assert get_session() is session
+    close_session()
+    assert get_session() is not session
+    close_session()
+
+# merge responses from multiple tiles
+
+def test_merge_responses():
+    responses = [
+        {'elements': [{'type': 'way', 'id': 1}, {'type': 'node', 'id': 1}]},
+        {'elements': [{'type': 'way', 'id': 1}, {'type': 'way', 'id': 2}]}
+    ]
+    merged = merge_responses(responses)
+    assert [(e['type'], e['id']) for e in merged['elements']] == [
+        ('way', 1), ('node', 1), ('way', 2)]
+
+# concurrent rate-limited requests
+
+def test_request_many(monkeypatch):
+    calls = []
+
+    def _request(query, endpoint=None, timeout=None):
+        calls.append(time.monotonic())
+        # first queries finish last
+        time.sleep(0.1 / (int(query) + 1))
+        return {'elements': [{'type': 'node', 'id': int(query)}]}
+
+    monkeypatch.setattr(overpass, 'request', _request)
+    queries = [str(i) for i in range(5)]
+    responses = request_many(queries, max_workers=3, min_delay=0.05)
+    assert [r['elements'][0]['id'] for r in responses] == list(range(5))
+    calls.sort()
+    delays = [b - a for a, b in zip(calls, calls[1:])]
+    # small margin for thread scheduling between the limiter and the call
+    assert min(delays) >= 0.045
+
+# parse streamed elements as geojson
+
+_ELEMENTS = [
+    {'type': 'node', 'id': 1, 'lat': 44.9, 'lon': 4.0,
+     'tags': {'amenity': 'cafe'}},
+    {'type': 'way', 'id': 2, 'tags': {'highway': 'primary'},
+     'geometry': [{'lat': 44.9, 'lon': 4.0}, {'lat': 44.91, 'lon': 4.01}]}
+]
+
+def test_as_geojson_stream():
+    feature_collection = as_geojson(iter(_ELEMENTS), 'point')
+    assert len(feature_collection['features']) == 1
+    feature = feature_collection['features'][0]
+    assert feature['id'] == 1
+    assert feature['geometry']['coordinates'] == [4.0, 44.9]
+
+def test_as_geojson_multiple():
+    collections = as_geojson({'elements': _ELEMENTS}, ['point', 'linestring'])
+    assert set(collections) == {'point', 'linestring'}
+    assert len(collections['point']['features']) == 1
+    assert len(collections['linestring']['features']) == 1
+    assert collections['linestring']['features'][0]['id'] == 2
+
+def test_as_geojson_linestring_coords():
+    feature_collection = as_geojson({'elements': _ELEMENTS}, 'linestring')
+    coords = feature_collection['features'][0]['geometry']['coordinates']
+    assert [list(c) for c in coords] == [[4.0, 44.9], [4.01, 44.91]]
+
+def test_as_geojson_multipolygon():
+    relation = {
+        'type': 'relation', 'id': 3, 'tags': {'type': 'multipolygon'},
+        'members': [{'geometry': [{'lat': 0, 'lon': 0}, {'lat': 1, 'lon': 0},
+                                  {'lat': 1, 'lon': 1}, {'lat': 0, 'lon': 0}]}]
+    }
+    feature_collection = as_geojson({'elements': [relation]}, 'multipolygon')
+    assert feature_collection['features'][0]['id'] == 3
+
+def test_as_geojson_multipolygon_filter():
+    relations = [
+        {'type': 'relation', 'id': 4, 'members': []},
+        {'type': 'relation', 'id': 5, 'tags': {'type': 'route'}, 'members': []}
+    ]
+    feature_collection = as_geojson({'elements': relations}, 'multipolygon')
+    assert feature_collection['features'] == []
+
+# conditional requests with the on-disk cache
+
+_BODY = b'{"version": 0.6, "elements": [{"type": "node", "id": 1}]}'
+
+
+def test_request_not_modified(stub_session):
+    session = stub_session([
+        (200, {'ETag': '"v1"'}, _BODY),
+        (304,)
+    ])
+    expected = {'version': 0.6, 'elements': [{'type': 'node', 'id': 1}]}
+    assert request('query') == expected
+    assert request('query') == expected
+    assert session.sent_headers == [{}, {'If-None-Match': '"v1"'}]
+
+
+def test_iter_elements_not_modified(stub_session):
+    session = stub_session([
+        (200, {'Last-Modified': 'Tue, 13 Oct 2026'}, _BODY),
+        (304,)
+    ])
+    assert list(iter_elements('query')) == [{'type': 'node', 'id': 1}]
+    assert list(iter_elements('query')) == [{'type': 'node', 'id': 1}]
+    assert session.sent_headers == [
+        {}, {'If-Modified-Since': 'Tue, 13 Oct 2026'}]
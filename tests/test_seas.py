@@ -0,0 +1,92 @@
+import io
+import os
+import zipfile
+
+import fiona
+from shapely.geometry import box, mapping
+
+from osmxtract import seas
+
+_DATA = b'0123456789'
+
+
+def _setup(monkeypatch, tmp_path, stub_session, responses,
+           partial=None, validator=None):
+    monkeypatch.setattr(seas, 'URL', 'http://example.com/water.zip')
+    session = stub_session(responses)
+    if partial is not None:
+        (tmp_path / 'water.zip.part').write_bytes(partial)
+    if validator is not None:
+        (tmp_path / 'water.zip.part.validator').write_text(validator)
+    return session
+
+
+def test_download_resume(monkeypatch, tmp_path, stub_session):
+    session = _setup(monkeypatch, tmp_path, stub_session, [
+        (206, {'Content-Length': '6'}, _DATA[4:])
+    ], partial=_DATA[:4], validator='"v1"')
+    seas.download()
+    assert session.sent_headers == [{
+        'Accept-Encoding': 'identity',
+        'Range': 'bytes=4-',
+        'If-Range': '"v1"'
+    }]
+    assert session.sent_kwargs[0]['timeout'] == (5, 60)
+    assert (tmp_path / 'water.zip').read_bytes() == _DATA
+    assert os.listdir(tmp_path) == ['water.zip']
+
+
+def test_download_changed(monkeypatch, tmp_path, stub_session):
+    _setup(monkeypatch, tmp_path, stub_session, [
+        (200, {'ETag': '"v2"', 'Content-Length': '10'}, _DATA)
+    ], partial=b'old!', validator='"v1"')
+    seas.download()
+    assert (tmp_path / 'water.zip').read_bytes() == _DATA
+
+
+def test_download_complete(monkeypatch, tmp_path, stub_session):
+    _setup(monkeypatch, tmp_path, stub_session, [
+        (416, {'Content-Range': 'bytes */10'})
+    ], partial=_DATA, validator='"v1"')
+    seas.download()
+    assert (tmp_path / 'water.zip').read_bytes() == _DATA
+
+
+def test_download_unexpected_size(monkeypatch, tmp_path, stub_session):
+    session = _setup(monkeypatch, tmp_path, stub_session, [
+        (416, {'Content-Range': 'bytes */8'}),
+        (200, {'ETag': '"v2"', 'Content-Length': '10'}, _DATA)
+    ], partial=_DATA, validator='"v1"')
+    seas.download()
+    assert session.sent_headers[1] == {'Accept-Encoding': 'identity'}
+    assert (tmp_path / 'water.zip').read_bytes() == _DATA
+
+
+def _zipped_shapefile(tmp_path):
+    """Zipped water-polygons shapefile with ten 0.5x1 degree polygons."""
+    shp_dir = tmp_path / 'src' / 'water-polygons-split-4326'
+    shp_dir.mkdir(parents=True)
+    schema = {'geometry': 'Polygon', 'properties': {'x': 'int'}}
+    with fiona.open(str(shp_dir / 'water_polygons.shp'), 'w', crs='EPSG:4326',
+                    driver='ESRI Shapefile', schema=schema) as dst:
+        for i in range(10):
+            dst.write({'geometry': mapping(box(i, 0, i + 0.5, 1)),
+                       'properties': {'x': i}})
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for filename in os.listdir(shp_dir):
+            archive.write(shp_dir / filename,
+                          f'water-polygons-split-4326/{filename}')
+    return buffer.getvalue()
+
+
+def test_get_water_polygons(tmp_path, stub_session):
+    data = _zipped_shapefile(tmp_path)
+    stub_session([(200, {'Content-Length': str(len(data))}, data)])
+    assert not seas.is_downloaded()
+    features = seas.get_water_polygons((2.2, 0.2, 3.1, 0.8))
+    assert seas.is_downloaded() and seas.is_converted()
+    assert sorted(f['properties']['x'] for f in features) == [2, 3]
+    assert features[0]['geometry']['type'] == 'Polygon'
+    # second call reads the converted file without downloading again
+    assert len(seas.get_water_polygons((2.2, 0.2, 3.1, 0.8))) == 2